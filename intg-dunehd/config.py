@@ -6,12 +6,14 @@ Configuration handling of the integration driver.
 """
 
 import dataclasses
-import json
+import hashlib
 import logging
 import os
 from dataclasses import dataclass
 from typing import Iterator
 
+import orjson
+
 _LOG = logging.getLogger(__name__)
 
 _CFG_FILENAME = "config.json"
@@ -26,15 +28,6 @@ class DuneHDDeviceConfig:
     address: str
 
 
-class _EnhancedJSONEncoder(json.JSONEncoder):
-    """Python dataclass json encoder."""
-
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        return super().default(o)
-
-
 class Devices:
     """Integration driver configuration class. Manages all configured Denon devices."""
 
@@ -46,7 +39,8 @@ class Devices:
         """
         self._data_path: str = data_path
         self._cfg_file_path: str = os.path.join(data_path, _CFG_FILENAME)
-        self._config: list[DuneHDDeviceConfig] = []
+        self._config: dict[str, DuneHDDeviceConfig] = {}
+        self._last_hash: bytes | None = None
         self._add_handler = add_handler
         self._remove_handler = remove_handler
 
@@ -59,56 +53,47 @@ class Devices:
 
     def all(self) -> Iterator[DuneHDDeviceConfig]:
         """Get an iterator for all device configurations."""
-        return iter(self._config)
+        return iter(self._config.values())
 
     def contains(self, device_id: str) -> bool:
         """Check if there's a device with the given device identifier."""
-        for item in self._config:
-            if item.identifier == device_id:
-                return True
-        return False
+        return device_id in self._config
 
     def add(self, device: DuneHDDeviceConfig) -> None:
         """Add a new configured Denon device."""
         # TODO duplicate check
-        self._config.append(device)
+        self._config[device.identifier] = device
         if self._add_handler is not None:
             self._add_handler(device)
 
     def get(self, device_id: str) -> DuneHDDeviceConfig | None:
         """Get device configuration for given identifier."""
-        for item in self._config:
-            if item.identifier == device_id:
-                # return a copy
-                return dataclasses.replace(item)
-        return None
+        item = self._config.get(device_id)
+        # return a copy
+        return dataclasses.replace(item) if item else None
 
     def update(self, device: DuneHDDeviceConfig) -> bool:
         """Update a configured Denon device and persist configuration."""
-        for item in self._config:
-            if item.identifier == device.identifier:
-                item.address = device.address
-                item.name = device.name
-                return self.store()
-        return False
+        item = self._config.get(device.identifier)
+        if item is None:
+            return False
+        item.address = device.address
+        item.name = device.name
+        return self.store()
 
     def remove(self, device_id: str) -> bool:
         """Remove the given device configuration."""
-        device = self.get(device_id)
+        device = self._config.pop(device_id, None)
         if device is None:
             return False
-        try:
-            self._config.remove(device)
-            if self._remove_handler is not None:
-                self._remove_handler(device)
-            return True
-        except ValueError:
-            pass
-        return False
+        if self._remove_handler is not None:
+            self._remove_handler(device)
+        return True
 
     def clear(self) -> None:
         """Remove the configuration file."""
-        self._config = []
+        self._config = {}
+        self._last_hash = None
 
         if os.path.exists(self._cfg_file_path):
             os.remove(self._cfg_file_path)
@@ -116,18 +101,43 @@ class Devices:
         if self._remove_handler is not None:
             self._remove_handler(None)
 
+    def _serialize(self) -> bytes:
+        return orjson.dumps(list(self._config.values()))
+
     def store(self) -> bool:
         """
         Store the configuration file.
 
+        The file is only rewritten if the serialized configuration changed since the last load or store.
+
         :return: True if the configuration could be saved.
         """
+        payload = self._serialize()
+        payload_hash = hashlib.blake2b(payload, digest_size=16).digest()
+        if payload_hash == self._last_hash and os.path.exists(self._cfg_file_path):
+            return True
+
+        tmp_file_path = self._cfg_file_path + ".tmp"
         try:
-            with open(self._cfg_file_path, "w+", encoding="utf-8") as f:
-                json.dump(self._config, f, ensure_ascii=False, cls=_EnhancedJSONEncoder)
+            fd = os.open(tmp_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                data = memoryview(payload)
+                while data:
+                    written = os.write(fd, data)
+                    data = data[written:]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            # atomically replace the previous configuration, a crash never leaves a partially written file behind
+            os.replace(tmp_file_path, self._cfg_file_path)
+            self._last_hash = payload_hash
             return True
         except OSError:
             _LOG.error("Cannot write the config file")
+            try:
+                os.remove(tmp_file_path)
+            except OSError:
+                pass
 
         return False
 
@@ -138,13 +148,15 @@ class Devices:
         :return: True if the configuration could be loaded.
         """
         try:
-            with open(self._cfg_file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(self._cfg_file_path, "rb") as f:
+                data = orjson.loads(f.read())
             for item in data:
                 try:
-                    self._config.append(DuneHDDeviceConfig(**item))
+                    device = DuneHDDeviceConfig(**item)
+                    self._config[device.identifier] = device
                 except TypeError as ex:
                     _LOG.warning("Invalid configuration entry will be ignored: %s", ex)
+            self._last_hash = hashlib.blake2b(self._serialize(), digest_size=16).digest()
             return True
         except OSError:
             _LOG.error("Cannot open the config file")
@@ -7,7 +7,6 @@ Represents a device / media player entity of the integration driver.
 
 import asyncio
 import logging
-import time
 from asyncio import AbstractEventLoop
 from enum import Enum, IntEnum
 from typing import Any
@@ -33,9 +32,9 @@ BACKOFF_SEC = 2
 
 POLL_INTERVAL = 1
 
-EMPTY_IMAGE = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAYAAABytg0kAAAAAXNSR0IArs4c6QAAAAlwSFlzAAAWJQAAFiUBSVIk8AAAABNJREFUCB1jZGBg+A/EDEwgAgQADigBA//q6GsAAAAASUVORK5CYII%3D"  # pylint: disable=line-too-long
+EMPTY_IMAGE = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAYAAABytg0kAAAAAXNSR0IArs4c6QAAAAlwSFlzAAAWJQAAFiUBSVIk8AAAABNJREFUCB1jZGBg+A/EDEwgAgQADigBA//q6GsAAAAASUVORK5CYII="  # pylint: disable=line-too-long
 
-FEATURES = [
+FEATURES = (
     media_player.Features.ON_OFF,
     media_player.Features.VOLUME,
     media_player.Features.VOLUME_UP_DOWN,
@@ -62,7 +61,77 @@ FEATURES = [
     media_player.Features.INFO,
     media_player.Features.AUDIO_TRACK,
     media_player.Features.SUBTITLE,
-]
+)
+
+_SIMPLE_COMMAND_VALUES = tuple(e.value for e in SimpleCommands)
+
+# Media-player attributes reported by the device, in the order computed by `_apply_status`.
+_ATTR_KEYS = (
+    Attributes.STATE,
+    Attributes.MEDIA_TYPE,
+    Attributes.MEDIA_DURATION,
+    Attributes.MEDIA_POSITION,
+    Attributes.MEDIA_TITLE,
+    Attributes.MEDIA_IMAGE_URL,
+    Attributes.VOLUME,
+    Attributes.MUTED,
+)
+
+_INITIAL_ATTRIBUTES: dict[str, Any] = {
+    Attributes.STATE: States.UNAVAILABLE,
+    Attributes.MEDIA_TYPE: "",
+    Attributes.MEDIA_DURATION: 0,
+    Attributes.MEDIA_POSITION: 0,
+    Attributes.MEDIA_TITLE: "",
+    Attributes.MEDIA_IMAGE_URL: EMPTY_IMAGE,
+    Attributes.VOLUME: 0,
+    Attributes.MUTED: False,
+}
+
+# Maps media-player commands without parameters to the client method name and optional argument to invoke.
+_CMD_TABLE: dict[str, tuple[str, Any]] = {
+    Commands.PLAY_PAUSE: ("toggle_play_pause", None),
+    Commands.STOP: ("stop", None),
+    Commands.NEXT: ("next", None),
+    Commands.PREVIOUS: ("previous", None),
+    Commands.VOLUME_UP: ("volume_up", None),
+    Commands.VOLUME_DOWN: ("volume_down", None),
+    Commands.MUTE_TOGGLE: ("toggle_mute", None),
+    Commands.ON: ("power_on", None),
+    Commands.OFF: ("power_off", None),
+    Commands.CURSOR_UP: ("cursor_up", None),
+    Commands.CURSOR_DOWN: ("cursor_down", None),
+    Commands.CURSOR_LEFT: ("cursor_left", None),
+    Commands.CURSOR_RIGHT: ("cursor_right", None),
+    Commands.CURSOR_ENTER: ("enter", None),
+    Commands.BACK: ("back", None),
+    Commands.HOME: ("top_menu", None),
+    Commands.CONTEXT_MENU: ("popup_menu", None),
+    Commands.INFO: ("info", None),
+    Commands.DIGIT_0: ("send_ir_code", dunehd.IrCode.DIGIT_0),
+    Commands.DIGIT_1: ("send_ir_code", dunehd.IrCode.DIGIT_1),
+    Commands.DIGIT_2: ("send_ir_code", dunehd.IrCode.DIGIT_2),
+    Commands.DIGIT_3: ("send_ir_code", dunehd.IrCode.DIGIT_3),
+    Commands.DIGIT_4: ("send_ir_code", dunehd.IrCode.DIGIT_4),
+    Commands.DIGIT_5: ("send_ir_code", dunehd.IrCode.DIGIT_5),
+    Commands.DIGIT_6: ("send_ir_code", dunehd.IrCode.DIGIT_6),
+    Commands.DIGIT_7: ("send_ir_code", dunehd.IrCode.DIGIT_7),
+    Commands.DIGIT_8: ("send_ir_code", dunehd.IrCode.DIGIT_8),
+    Commands.DIGIT_9: ("send_ir_code", dunehd.IrCode.DIGIT_9),
+    Commands.CHANNEL_UP: ("send_ir_code", dunehd.IrCode.PROGRAM_UP),
+    Commands.CHANNEL_DOWN: ("send_ir_code", dunehd.IrCode.PROGRAM_DOWN),
+    Commands.AUDIO_TRACK: ("send_ir_code", dunehd.IrCode.AUDIO),
+    Commands.SUBTITLE: ("send_ir_code", dunehd.IrCode.SUBTITLE),
+    SimpleCommands.BLACK_SCREEN: ("send_command", dunehd.Command.BLACK_SCREEN),
+    SimpleCommands.MAIN_SCREEN: ("send_command", dunehd.Command.MAIN_SCREEN),
+}
+
+# Maps failed command error kinds to the status code returned to the Remote.
+_ERROR_MAP: dict[dunehd.ErrorKind, StatusCodes] = {
+    dunehd.ErrorKind.INVALID_PARAMETERS: StatusCodes.BAD_REQUEST,
+    dunehd.ErrorKind.UNKNOWN_COMMAND: StatusCodes.NOT_IMPLEMENTED,
+    dunehd.ErrorKind.ILLEGAL_STATE: StatusCodes.CONFLICT,
+}
 
 
 class EVENTS(IntEnum):
@@ -90,18 +159,9 @@ class DuneHDDevice:
         self.events = AsyncIOEventEmitter(self._loop)
 
         self._device = device
-        self._media_player_attributes: dict[str, Any] = {
-            media_player.Attributes.STATE: States.UNAVAILABLE,
-            media_player.Attributes.MEDIA_TYPE: "",
-            media_player.Attributes.MEDIA_DURATION: 0,
-            media_player.Attributes.MEDIA_POSITION: 0,
-            media_player.Attributes.MEDIA_TITLE: "",
-            media_player.Attributes.MEDIA_IMAGE_URL: EMPTY_IMAGE,
-            media_player.Attributes.VOLUME: 0,
-            media_player.Attributes.MUTED: False,
-        }
+        self._media_player_attributes: dict[str, Any] = _INITIAL_ATTRIBUTES.copy()
         self._media_player = self._create_media_player()
-        self._client = dunehd.Client(device.address)
+        self._client = dunehd.Client(device.address, loop=self._loop)
         self._connection_task: asyncio.Task | None = None
         self._connection_state: _ConnectionState = _ConnectionState.DISCONNECTED
 
@@ -110,14 +170,15 @@ class DuneHDDevice:
             self.identifier,
             self.name,
             FEATURES,
-            self.media_player_attributes,
+            dict(self._media_player_attributes),
             device_class=media_player.DeviceClasses.STREAMING_BOX,
-            options={media_player.Options.SIMPLE_COMMANDS: [e.value for e in SimpleCommands]},
+            options={media_player.Options.SIMPLE_COMMANDS: _SIMPLE_COMMAND_VALUES},
             cmd_handler=self._media_player_cmd_handler,
         )
 
     def __del__(self):
-        self.disconnect()
+        if self._connection_task:
+            self._connection_task.cancel()
 
     @property
     def identifier(self) -> str:
@@ -149,184 +210,105 @@ class DuneHDDevice:
         """Returns the current media player attributes."""
         return self._media_player_attributes
 
-    # pylint: disable=too-many-return-statements,too-many-branches,too-many-statements,unused-argument
+    # pylint: disable=too-many-return-statements,unused-argument
     async def _media_player_cmd_handler(
         self, entity: MediaPlayer, cmd_id: str, params: dict[str, Any] | None
     ) -> StatusCodes:
-        _LOG.debug("Process cmd %s", cmd_id)
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug("Process cmd %s", cmd_id)
 
         try:
-            if cmd_id == Commands.PLAY_PAUSE:
-                status = await self._client.toggle_play_pause()
-            elif cmd_id == Commands.STOP:
-                status = await self._client.stop()
-            elif cmd_id == Commands.NEXT:
-                status = await self._client.next()
-            elif cmd_id == Commands.PREVIOUS:
-                status = await self._client.previous()
-            elif cmd_id == Commands.VOLUME:
+            if cmd_id == Commands.VOLUME:
                 status = await self._client.set_volume(params.get("volume"))
-            elif cmd_id == Commands.VOLUME_UP:
-                status = await self._client.volume_up()
-            elif cmd_id == Commands.VOLUME_DOWN:
-                status = await self._client.volume_down()
-            elif cmd_id == Commands.MUTE_TOGGLE:
-                status = await self._client.toggle_mute()
-            elif cmd_id == Commands.ON:
-                status = await self._client.power_on()
-            elif cmd_id == Commands.OFF:
-                status = await self._client.power_off()
-            elif cmd_id == Commands.CURSOR_UP:
-                status = await self._client.cursor_up()
-            elif cmd_id == Commands.CURSOR_DOWN:
-                status = await self._client.cursor_down()
-            elif cmd_id == Commands.CURSOR_LEFT:
-                status = await self._client.cursor_left()
-            elif cmd_id == Commands.CURSOR_RIGHT:
-                status = await self._client.cursor_right()
-            elif cmd_id == Commands.CURSOR_ENTER:
-                status = await self._client.enter()
-            elif cmd_id == Commands.BACK:
-                status = await self._client.back()
-            elif cmd_id == Commands.HOME:
-                status = await self._client.top_menu()
-            elif cmd_id == Commands.CONTEXT_MENU:
-                status = await self._client.popup_menu()
-            elif cmd_id == Commands.INFO:
-                status = await self._client.info()
             elif cmd_id == Commands.SEEK:
                 status = await self._client.seek(params.get("media_position"))
-            elif cmd_id == Commands.DIGIT_0:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_0)
-            elif cmd_id == Commands.DIGIT_1:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_1)
-            elif cmd_id == Commands.DIGIT_2:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_2)
-            elif cmd_id == Commands.DIGIT_3:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_3)
-            elif cmd_id == Commands.DIGIT_4:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_4)
-            elif cmd_id == Commands.DIGIT_5:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_5)
-            elif cmd_id == Commands.DIGIT_6:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_6)
-            elif cmd_id == Commands.DIGIT_7:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_7)
-            elif cmd_id == Commands.DIGIT_8:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_8)
-            elif cmd_id == Commands.DIGIT_9:
-                status = await self._client.send_ir_code(dunehd.IrCode.DIGIT_9)
-            elif cmd_id == Commands.CHANNEL_UP:
-                status = await self._client.send_ir_code(dunehd.IrCode.PROGRAM_UP)
-            elif cmd_id == Commands.CHANNEL_DOWN:
-                status = await self._client.send_ir_code(dunehd.IrCode.PROGRAM_DOWN)
-            elif cmd_id == Commands.AUDIO_TRACK:
-                status = await self._client.send_ir_code(dunehd.IrCode.AUDIO)
-            elif cmd_id == Commands.SUBTITLE:
-                status = await self._client.send_ir_code(dunehd.IrCode.SUBTITLE)
-            elif cmd_id == SimpleCommands.BLACK_SCREEN:
-                status = await self._client.send_command(dunehd.Command.BLACK_SCREEN)
-            elif cmd_id == SimpleCommands.MAIN_SCREEN:
-                status = await self._client.send_command(dunehd.Command.MAIN_SCREEN)
             else:
-                return StatusCodes.NOT_IMPLEMENTED
+                entry = _CMD_TABLE.get(cmd_id)
+                if entry is None:
+                    return StatusCodes.NOT_IMPLEMENTED
+                method, arg = entry
+                if arg is None:
+                    status = await getattr(self._client, method)()
+                else:
+                    status = await getattr(self._client, method)(arg)
         except Exception as e:  # pylint: disable=broad-except
             _LOG.error("Error for cmd %s: %s", cmd_id, e)
             return StatusCodes.SERVER_ERROR
 
         if status.command_status == dunehd.CommandStatus.FAILED:
             _LOG.error("Command status failed - %s: %s", status.error_kind, status.error_description)
-            if status.error_kind == dunehd.ErrorKind.INVALID_PARAMETERS:
-                return StatusCodes.BAD_REQUEST
-            if status.error_kind == dunehd.ErrorKind.UNKNOWN_COMMAND:
-                return StatusCodes.NOT_IMPLEMENTED
-            if status.error_kind == dunehd.ErrorKind.ILLEGAL_STATE:
-                return StatusCodes.CONFLICT
-            return StatusCodes.SERVER_ERROR
+            return _ERROR_MAP.get(status.error_kind, StatusCodes.SERVER_ERROR)
 
         if status.command_status == dunehd.CommandStatus.TIMEOUT:
             return StatusCodes.TIMEOUT
 
         return StatusCodes.OK
 
-    def _attributes_for_status(self, status: dunehd.Status) -> dict[str, Any]:
-        attributes = {}
+    def _apply_status(self, status: dunehd.Status) -> dict[str, Any]:
+        """Return the media player attributes that changed for the given status, or all of them if the state did."""
+        attributes = self._media_player_attributes
 
         if status.player_state == dunehd.PlayerState.STANDBY:
-            attributes[Attributes.STATE] = States.OFF
+            state = States.OFF
         elif status.playback_is_buffering or status.playback_state == dunehd.PlaybackState.INITIALIZING:
-            attributes[Attributes.STATE] = States.BUFFERING
+            state = States.BUFFERING
         elif status.playback_state == dunehd.PlaybackState.PLAYING:
-            attributes[Attributes.STATE] = States.PLAYING
+            state = States.PLAYING
         elif status.playback_state == dunehd.PlaybackState.PAUSED:
-            attributes[Attributes.STATE] = States.PAUSED
+            state = States.PAUSED
         elif status.playback_state == dunehd.PlaybackState.SEEKING:
-            attributes[Attributes.STATE] = self._media_player_attributes[Attributes.STATE]
+            state = attributes[Attributes.STATE]
         else:
-            attributes[Attributes.STATE] = States.ON
-
-        attributes[media_player.Attributes.MEDIA_TYPE] = (
-            media_player.MediaType.VIDEO if status.playback_state is not None else ""
-        )
-        attributes[media_player.Attributes.MEDIA_DURATION] = status.playback_duration if status.playback_duration else 0
-        attributes[media_player.Attributes.MEDIA_POSITION] = status.playback_position if status.playback_position else 0
-        attributes[media_player.Attributes.MEDIA_TITLE] = status.playback_caption if status.playback_caption else ""
+            state = States.ON
 
         if status.playback_state is not None and status.playback_picture is not None:
-            attributes[media_player.Attributes.MEDIA_IMAGE_URL] = self._client.get_file_url(status.playback_picture)
+            image_url = self._client.get_file_url(status.playback_picture)
         elif status.playback_state is not None and status.ui_state.screen.bg_url is not None:
-            attributes[media_player.Attributes.MEDIA_IMAGE_URL] = self._client.get_file_url(
-                status.ui_state.screen.bg_url
-            )
+            image_url = self._client.get_file_url(status.ui_state.screen.bg_url)
         else:
-            attributes[media_player.Attributes.MEDIA_IMAGE_URL] = EMPTY_IMAGE
-
-        attributes[media_player.Attributes.VOLUME] = status.playback_volume
-        attributes[media_player.Attributes.MUTED] = status.playback_mute
-
-        return attributes
-
-    def _filter_changed_attributes(
-        self, old_attributes: dict[str, Any] | None, new_attributes: dict[str, Any]
-    ) -> dict[str, Any]:
-        if old_attributes is None:
-            return new_attributes
-
-        if old_attributes.get(media_player.Attributes.STATE) != new_attributes.get(media_player.Attributes.STATE):
-            return new_attributes
+            image_url = EMPTY_IMAGE
+
+        values = (
+            state,
+            media_player.MediaType.VIDEO if status.playback_state is not None else "",
+            status.playback_duration if status.playback_duration else 0,
+            status.playback_position if status.playback_position else 0,
+            status.playback_caption if status.playback_caption else "",
+            image_url,
+            status.playback_volume,
+            status.playback_mute,
+        )
 
-        changed_attributes = {}
-        for key in set([*new_attributes.keys(), *old_attributes.keys()]):
-            if new_attributes.get(key) != old_attributes.get(key):
-                changed_attributes[key] = new_attributes[key]
+        if attributes.get(Attributes.STATE) != state:
+            return dict(zip(_ATTR_KEYS, values))
 
-        return changed_attributes
+        return {key: value for key, value in zip(_ATTR_KEYS, values) if attributes.get(key) != value}
 
     async def _connection(self) -> None:
-        _LOG.debug("[%s] Connecting (attempt 1)...", self.identifier)
+        debug = _LOG.isEnabledFor(logging.DEBUG)
+        if debug:
+            _LOG.debug("[%s] Connecting (attempt 1)...", self.identifier)
         self._connection_state = _ConnectionState.CONNECTING
         connection_attempt = 1
 
         self.events.emit(EVENTS.CONNECTING, self._device.identifier)
 
-        async with dunehd.Client(self._device.address, loop=self._loop) as client:
+        try:
             while True:
-                start = time.time()
+                start = self._loop.time()
 
                 try:
-                    status = await client.ui_state()
-                    attrs = self._attributes_for_status(status)
+                    status = await self._client.ui_state()
+                    changed_attrs = self._apply_status(status)
+                    self._media_player_attributes.update(changed_attrs)
 
                     if self._connection_state == _ConnectionState.CONNECTING:
-                        _LOG.debug("[%s] Connected", self.identifier)
+                        if debug:
+                            _LOG.debug("[%s] Connected", self.identifier)
                         self._connection_state = _ConnectionState.CONNECTED
-                        self.events.emit(EVENTS.CONNECTED, self._device.identifier, attrs)
-                    else:
-                        changed_attrs = self._filter_changed_attributes(self._media_player_attributes, attrs)
-                        if len(changed_attrs) > 0:
-                            self.events.emit(EVENTS.UPDATE, self._device.identifier, changed_attrs)
-
-                    self._media_player_attributes = attrs
+                        self.events.emit(EVENTS.CONNECTED, self._device.identifier, dict(self._media_player_attributes))
+                    elif changed_attrs:
+                        self.events.emit(EVENTS.UPDATE, self._device.identifier, changed_attrs)
 
                     delay = POLL_INTERVAL
                 except asyncio.CancelledError:  # pylint: disable=try-except-raise
@@ -335,25 +317,44 @@ class DuneHDDevice:
                     if self._connection_state == _ConnectionState.CONNECTING:
                         connection_attempt += 1
                     else:
-                        _LOG.debug("[%s] Disconnected...", self.identifier)
+                        if debug:
+                            _LOG.debug("[%s] Disconnected...", self.identifier)
                         self.events.emit(EVENTS.DISCONNECTED, self._device.identifier)
                         self._connection_state = _ConnectionState.CONNECTING
                         connection_attempt = 1
                         self.events.emit(EVENTS.CONNECTING, self._device.identifier)
 
-                    _LOG.debug("[%s] Connecting (attempt %d)...", self.identifier, connection_attempt)
-                    duration = time.time() - start
+                    if debug:
+                        _LOG.debug("[%s] Connecting (attempt %d)...", self.identifier, connection_attempt)
+                    duration = self._loop.time() - start
                     delay = max(min(connection_attempt * BACKOFF_SEC, BACKOFF_MAX) - duration, 0.1)
 
                 await asyncio.sleep(delay)
+        finally:
+            await self._client.close()
 
     def connect(self) -> None:
         if self._connection_task is None:
             self._connection_task = self._loop.create_task(self._connection())
 
-    def disconnect(self) -> None:
-        if self._connection_task:
-            self._connection_task.cancel()
-            self._connection_task = None
+    async def disconnect(self) -> None:
+        task = self._connection_task
+        if task is None:
+            return
+
+        self._connection_task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            # only swallow the cancellation of the connection task, not of the task awaiting disconnect
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+
+        # a new connection might have been started in the meantime
+        if self._connection_task is None:
             self._connection_state = _ConnectionState.DISCONNECTED
             self.events.emit(EVENTS.DISCONNECTED, self._device.identifier)
@@ -18,6 +18,14 @@ import ucapi.api as uc
 from device import EVENTS, DuneHDDevice
 from ucapi import media_player
 
+try:
+    import uvloop
+
+    # must be set before the event loop below is created
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 _LOG = logging.getLogger("driver")  # avoid having __main__ in log messages
 _LOOP = asyncio.get_event_loop()
 
@@ -25,6 +33,7 @@ _LOOP = asyncio.get_event_loop()
 # Global variables
 api = uc.IntegrationAPI(_LOOP)
 _configured_devices: dict[str, DuneHDDevice] = {}
+_background_tasks: set[asyncio.Task] = set()
 
 
 @api.listens_to(ucapi.Events.CONNECT)
@@ -40,8 +49,7 @@ async def on_r2_connect_cmd() -> None:
 async def on_r2_disconnect_cmd():
     """Disconnect all configured devices when the Remote Two sends the disconnect command."""
     _LOG.debug("Client disconnect command: disconnecting device(s)")
-    for device in _configured_devices.values():
-        device.disconnect()
+    await asyncio.gather(*(device.disconnect() for device in list(_configured_devices.values())))
 
 
 @api.listens_to(ucapi.Events.ENTER_STANDBY)
@@ -52,8 +60,7 @@ async def on_r2_enter_standby() -> None:
     Disconnect every device instance.
     """
     _LOG.debug("Enter standby event: disconnecting device(s)")
-    for device in _configured_devices.values():
-        device.disconnect()
+    await asyncio.gather(*(device.disconnect() for device in list(_configured_devices.values())))
 
 
 @api.listens_to(ucapi.Events.EXIT_STANDBY)
@@ -142,7 +149,7 @@ def _configure_new_device(device: config.DuneHDDeviceConfig, connect: bool = Tru
     # the device should not yet be configured, but better be safe
     if device.identifier in _configured_devices:
         device = _configured_devices[device.identifier]
-        device.disconnect()
+        _create_task(_reconfigure_device(device, connect))
     else:
         _LOG.debug(
             "Adding new DuneHD device: %s (%s) %s",
@@ -158,10 +165,24 @@ def _configure_new_device(device: config.DuneHDDeviceConfig, connect: bool = Tru
 
         _configured_devices[device.identifier] = device
 
+        if connect:
+            device.connect()
+
+    _register_available_entities(device)
+
+
+async def _reconfigure_device(device: DuneHDDevice, connect: bool) -> None:
+    """Disconnect an already configured device and reconnect it if requested."""
+    await device.disconnect()
     if connect:
         device.connect()
 
-    _register_available_entities(device)
+
+def _create_task(coro) -> None:
+    """Schedule a coroutine from a synchronous callback and keep a reference until it's done."""
+    task = _LOOP.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 def _register_available_entities(device: DuneHDDevice) -> None:
@@ -195,7 +216,7 @@ def _remove_device(device: DuneHDDevice) -> None:
     """Disconnect from device and remove all listeners."""
     _LOG.debug("Disconnecting & removing device %s", device.identifier)
     device.events.remove_all_listeners()
-    device.disconnect()
+    _create_task(device.disconnect())
     entity_id = device.identifier
     api.configured_entities.remove(entity_id)
     api.available_entities.remove(entity_id)
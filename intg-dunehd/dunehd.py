@@ -6,19 +6,36 @@ Asynchronous implementation of a Dune-HD API client.
 """
 
 import asyncio
-import re
+import atexit
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from enum import Enum, IntEnum
 from types import TracebackType
-from typing import Any, Literal, Optional, Self, Type, overload
+from typing import Any, AsyncIterator, Callable, Literal, Optional, Self, Type, overload
+from urllib.parse import quote
 
 import aiohttp
-from pydantic import BaseModel
+import orjson
+from aiohttp import hdrs
 from yarl import URL
 
 NEC_CUSTOMER_CODE = "CFCF"
 
 DEFAULT_TIMEOUT = 5
 
+DEFAULT_CONNECTION_LIMIT = 8
+# concurrent connections to a Dune-HD are not verified to work, use a single keep-alive connection by default
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 1
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+# the shared session serves multiple device addresses
+SHARED_CONNECTION_LIMIT = 32
+
+STATUS_CACHE_TTL = 0.25
+
+FILE_CACHE_SIZE = 32
+FILE_CACHE_MAX_ENTRY_SIZE = 256 * 1024
+
 
 class PlayerState(Enum):
     NAVIGATOR = "navigator"
@@ -106,6 +123,10 @@ class IrCode(Enum):
     AUDIO = "44BB"
 
 
+# NEC IR payloads: the byte-reversed code followed by the customer code
+_NEC_PAYLOAD: dict[IrCode, str] = {code: code.value[2:4] + code.value[0:2] + NEC_CUSTOMER_CODE for code in IrCode}
+
+
 class Command(Enum):
     STATUS = "status"
     UI_STATE = "ui_state"
@@ -137,16 +158,37 @@ class ResultType(Enum):
     BYTES = "bytes"
 
 
-class UIStateScreen(BaseModel):
+def _optional(convert: Callable[[Any], Any], value: Any) -> Any:
+    return None if value is None else convert(value)
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+@dataclass(slots=True, frozen=True, kw_only=True)
+class UIStateScreen:
     bg_url: Optional[str] = None
     poster_url: Optional[str] = None
 
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(bg_url=data.get("bg_url"), poster_url=data.get("poster_url"))
 
-class UIState(BaseModel):
+
+@dataclass(slots=True, frozen=True, kw_only=True)
+class UIState:
     screen: Optional[UIStateScreen] = None
 
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(screen=_optional(UIStateScreen.from_dict, data.get("screen")))
+
 
-class Status(BaseModel):
+@dataclass(slots=True, frozen=True, kw_only=True)
+class Status:
     command_status: Optional[CommandStatus] = None
     error_kind: Optional[ErrorKind] = None
     error_description: Optional[str] = None
@@ -169,25 +211,140 @@ class Status(BaseModel):
     serial_number: str
     commercial_serial_number: str
     firmware_version: str
-    ui_state: Optional[UIState] = (None,)
-    raw: dict[str, Any] = None
+    ui_state: Optional[UIState] = None
+    # the undecoded response duplicates all fields above, keep it out of repr and comparisons
+    raw: dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        """Create a status from a decoded response, the device reports numbers and booleans as strings."""
+        return cls(
+            command_status=_optional(CommandStatus, data.get("command_status")),
+            error_kind=_optional(ErrorKind, data.get("error_kind")),
+            error_description=data.get("error_description"),
+            player_state=PlayerState(data["player_state"]),
+            playback_url=data.get("playback_url"),
+            playback_state=_optional(PlaybackState, data.get("playback_state")),
+            previous_playback_state=_optional(PlaybackState, data.get("previous_playback_state")),
+            playback_speed=_optional(lambda v: PlaybackSpeed(int(v)), data.get("playback_speed")),
+            playback_duration=_optional(int, data.get("playback_duration")),
+            playback_position=_optional(int, data.get("playback_position")),
+            playback_is_buffering=_optional(_to_bool, data.get("playback_is_buffering")),
+            playback_volume=int(data["playback_volume"]),
+            playback_mute=_to_bool(data["playback_mute"]),
+            playback_caption=data.get("playback_caption"),
+            playback_extra_caption=data.get("playback_extra_caption"),
+            playback_picture=data.get("playback_picture"),
+            protocol_version=int(data["protocol_version"]),
+            product_id=data["product_id"],
+            product_name=data["product_name"],
+            serial_number=data["serial_number"],
+            commercial_serial_number=data["commercial_serial_number"],
+            firmware_version=data["firmware_version"],
+            ui_state=_optional(UIState.from_dict, data.get("ui_state")),
+            raw=data,
+        )
+
+
+_CMD_VALUE: dict[Command | str, str] = {cmd: cmd.value for cmd in Command}
+
+_READ_ONLY_COMMANDS = frozenset((Command.STATUS.value, Command.UI_STATE.value, Command.GET_FILE.value))
+_CACHEABLE_COMMANDS = frozenset((Command.STATUS.value, Command.UI_STATE.value))
+
+_shared_session: aiohttp.ClientSession | None = None  # pylint: disable=invalid-name
+_shared_session_loop: asyncio.AbstractEventLoop | None = None  # pylint: disable=invalid-name
+
+
+def shared_session() -> aiohttp.ClientSession:
+    """
+    Return the HTTP session shared by short-lived clients, e.g. during setup.
+
+    The session is created on first use and must be requested from within a running event loop.
+    """
+    global _shared_session, _shared_session_loop
+
+    if _shared_session is None or _shared_session.closed:
+        _shared_session_loop = asyncio.get_running_loop()
+        _shared_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=SHARED_CONNECTION_LIMIT,
+                limit_per_host=DEFAULT_CONNECTION_LIMIT_PER_HOST,
+                keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True,
+            ),
+            timeout=aiohttp.ClientTimeout(sock_connect=DEFAULT_TIMEOUT, sock_read=DEFAULT_TIMEOUT),
+            raise_for_status=True,
+        )
+    return _shared_session
+
+
+async def close_shared_session() -> None:
+    """Close the shared HTTP session, if any."""
+    global _shared_session
+
+    if _shared_session is not None:
+        session, _shared_session = _shared_session, None
+        await session.close()
+
+
+@atexit.register
+def _close_shared_session_at_exit() -> None:
+    if _shared_session is None or _shared_session.closed:
+        return
+    if not _shared_session_loop.is_closed() and not _shared_session_loop.is_running():
+        _shared_session_loop.run_until_complete(close_shared_session())
 
 
 class Client:
     def __init__(
-        self, address=str, *, timeout: int = DEFAULT_TIMEOUT, loop: asyncio.AbstractEventLoop | None = None
+        self,
+        address=str,
+        *,
+        timeout: int = DEFAULT_TIMEOUT,
+        loop: asyncio.AbstractEventLoop | None = None,
+        session: aiohttp.ClientSession | None = None,
+        limit: int = DEFAULT_CONNECTION_LIMIT,
+        limit_per_host: int = DEFAULT_CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
     ) -> None:
         self._address = address
-        self._client = aiohttp.ClientSession(
-            base_url="http://" + address,
-            connector=aiohttp.TCPConnector(limit=1),
-            timeout=aiohttp.ClientTimeout(total=timeout),
-            loop=loop,
-            raise_for_status=True,
-        )
+        self._endpoint = URL("http://" + address + "/cgi-bin/do")
+        self._file_url_prefix = f"{self._endpoint}?cmd={Command.GET_FILE.value}&path="
+        # socket level bounds apply to every request, including streamed file downloads
+        self._timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+        self._call_timeout = timeout
+        self._loop = loop
+        self._client: aiohttp.ClientSession | None = session
+        self._owns_session = session is None
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._status_cache: dict[str, tuple[float, Status]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self._file_cache: OrderedDict[str, tuple[str | None, str | None, bytes]] = OrderedDict()
+
+    def _session(self) -> aiohttp.ClientSession:
+        # created on demand, so the client can be reused after it has been closed
+        if self._client is None or self._client.closed:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._limit,
+                    limit_per_host=self._limit_per_host,
+                    keepalive_timeout=self._keepalive_timeout,
+                    enable_cleanup_closed=True,
+                ),
+                timeout=self._timeout,
+                loop=self._loop,
+                raise_for_status=True,
+            )
+        return self._client
 
     async def close(self) -> None:
-        return await self._client.close()
+        # a session passed in by the caller is left open for other clients
+        if self._owns_session and self._client is not None:
+            client, self._client = self._client, None
+            await client.close()
 
     async def __aenter__(self) -> Self:
         return self
@@ -204,6 +361,11 @@ class Client:
     async def ui_state(self) -> Status:
         return await self.send_command(Command.UI_STATE)
 
+    async def probe(self) -> tuple[str, str]:
+        """Return the product name and serial number, without decoding the full status."""
+        data = await self._send_json(_CMD_VALUE[Command.STATUS], None)
+        return data["product_name"], data["serial_number"]
+
     async def toggle_power(self) -> Status:
         return await self.send_ir_code(IrCode.POWER)
 
@@ -286,19 +448,62 @@ class Client:
         return await self.send_command(Command.LAUNCH_MEDIA_URL, params={"media_url": media_url})
 
     async def get_file(self, path: str) -> bytes:
-        return await self.send_command(Command.GET_FILE, params={"path": path}, result_type=ResultType.BYTES)
+        """Download a file, using a conditional request if a validator of a previous download is known."""
+        query = (("cmd", _CMD_VALUE[Command.GET_FILE]), ("path", path))
+        headers = {}
+        cached = self._file_cache.get(path)
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers[hdrs.IF_NONE_MATCH] = etag
+            if last_modified:
+                headers[hdrs.IF_MODIFIED_SINCE] = last_modified
+
+        async with asyncio.timeout(self._call_timeout):
+            async with self._session().get(
+                self._endpoint, params=query, headers=headers, timeout=self._timeout
+            ) as response:
+                if response.status == 304:
+                    if cached is None:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info,
+                            response.history,
+                            status=response.status,
+                            message="Not modified, but file is not cached",
+                            headers=response.headers,
+                        )
+                    # the entry might have been evicted or replaced while the request was in flight
+                    self._cache_file(path, cached)
+                    return cached[2]
+
+                body = await response.read()
+                etag = response.headers.get(hdrs.ETAG)
+                last_modified = response.headers.get(hdrs.LAST_MODIFIED)
+
+        # large files are not kept in memory, use stream_file() for those
+        if (etag or last_modified) and len(body) <= FILE_CACHE_MAX_ENTRY_SIZE:
+            self._cache_file(path, (etag, last_modified, body))
+        else:
+            self._file_cache.pop(path, None)
+        return body
+
+    def _cache_file(self, path: str, entry: tuple[str | None, str | None, bytes]) -> None:
+        self._file_cache[path] = entry
+        self._file_cache.move_to_end(path)
+        while len(self._file_cache) > FILE_CACHE_SIZE:
+            self._file_cache.popitem(last=False)
+
+    async def stream_file(self, path: str, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+        query = (("cmd", _CMD_VALUE[Command.GET_FILE]), ("path", path))
+        async with self._session().get(self._endpoint, params=query, timeout=self._timeout) as response:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
 
     def get_file_url(self, path: str) -> str:
-        return URL.build(
-            scheme="http", host=self._address, path="/cgi-bin/do", query={"cmd": Command.GET_FILE.value, "path": path}
-        ).human_repr()
+        return self._file_url_prefix + quote(path, safe="/")
 
     async def send_ir_code(self, code: IrCode):
-        reversed_code = "".join(re.findall(r"[A-F0-9]{2}", code.value)[::-1])
-        return await self.send_command(Command.IR_CODE, params={"ir_code": reversed_code + NEC_CUSTOMER_CODE})
-
-    def __parse_status(self, status) -> Status:
-        return Status(**status, raw=status)
+        return await self.send_command(Command.IR_CODE, params={"ir_code": _NEC_PAYLOAD[code]})
 
     @overload
     async def send_command(
@@ -317,16 +522,61 @@ class Client:
     async def send_command(
         self, cmd: Command | str, *, params: dict[str, Any] | None = None, result_type: ResultType = ResultType.STATUS
     ) -> Status | bytes:
-        if params is None:
-            params = {}
-
-        params["cmd"] = cmd.value if isinstance(cmd, Command) else cmd
-        if result_type == ResultType.STATUS:
-            params["result_syntax"] = "json"
-
-        async with self._client.get("/cgi-bin/do", params=params) as response:
-            if result_type == ResultType.BYTES:
+        cmd_value = _CMD_VALUE.get(cmd, cmd)
+
+        if cmd_value not in _READ_ONLY_COMMANDS:
+            # the device state might change, don't serve or join status requests from before this command
+            self._status_cache.clear()
+            self._inflight.clear()
+            self._generation += 1
+        elif not params and result_type == ResultType.STATUS and cmd_value in _CACHEABLE_COMMANDS:
+            return await self._cached_status(cmd_value)
+
+        if result_type is ResultType.BYTES:
+            return await self._send_bytes(cmd_value, params)
+        return await self._send_status(cmd_value, params)
+
+    async def _cached_status(self, cmd_value: str) -> Status:
+        cached = self._status_cache.get(cmd_value)
+        if cached is not None and asyncio.get_running_loop().time() - cached[0] < STATUS_CACHE_TTL:
+            return cached[1]
+
+        # piggyback on an identical request that is already in flight
+        task = self._inflight.get(cmd_value)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_status(cmd_value))
+            self._inflight[cmd_value] = task
+            task.add_done_callback(functools.partial(self._inflight_done, cmd_value))
+        return await asyncio.shield(task)
+
+    async def _fetch_status(self, cmd_value: str) -> Status:
+        generation = self._generation
+        status = await self._send_status(cmd_value, None)
+        if generation == self._generation:
+            self._status_cache[cmd_value] = (asyncio.get_running_loop().time(), status)
+        return status
+
+    def _inflight_done(self, cmd_value: str, task: asyncio.Task) -> None:
+        if self._inflight.get(cmd_value) is task:
+            del self._inflight[cmd_value]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved, waiters get the exception through shield
+
+    async def _send_status(self, cmd_value: str, params: dict[str, Any] | None) -> Status:
+        return Status.from_dict(await self._send_json(cmd_value, params))
+
+    async def _send_json(self, cmd_value: str, params: dict[str, Any] | None) -> dict[str, Any]:
+        query: list[tuple[str, Any]] = [("cmd", cmd_value), ("result_syntax", "json")]
+        if params:
+            query.extend(params.items())
+        async with asyncio.timeout(self._call_timeout):
+            async with self._session().get(self._endpoint, params=query, timeout=self._timeout) as response:
+                return orjson.loads(await response.read())
+
+    async def _send_bytes(self, cmd_value: str, params: dict[str, Any] | None) -> bytes:
+        query: list[tuple[str, Any]] = [("cmd", cmd_value)]
+        if params:
+            query.extend(params.items())
+        async with asyncio.timeout(self._call_timeout):
+            async with self._session().get(self._endpoint, params=query, timeout=self._timeout) as response:
                 return await response.read()
-
-            status = await response.json()
-            return self.__parse_status(status)
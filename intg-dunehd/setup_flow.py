@@ -5,9 +5,10 @@ Setup flow for Dune-HD integration.
 :license: Mozilla Public License Version 2.0, see LICENSE for more details.
 """
 
-import asyncio
 import logging
+from dataclasses import dataclass
 from enum import IntEnum
+from typing import Any, Awaitable, Callable
 
 import config
 import dunehd
@@ -35,7 +36,14 @@ class SetupSteps(IntEnum):
     DEVICE_CHOICE = 2
 
 
-_setup_step = SetupSteps.INIT
+@dataclass
+class SetupContext:
+    """State of the setup flow, the Remote runs at most one setup flow per integration at a time."""
+
+    step: SetupSteps = SetupSteps.INIT
+
+
+_context = SetupContext()
 
 
 async def driver_setup_handler(msg: SetupDriver) -> SetupAction:
@@ -47,21 +55,9 @@ async def driver_setup_handler(msg: SetupDriver) -> SetupAction:
     :param msg: the setup driver request object, either DriverSetupRequest or UserDataResponse
     :return: the setup action on how to continue
     """
-    global _setup_step
-
-    if isinstance(msg, DriverSetupRequest):
-        _setup_step = SetupSteps.INIT
-        return await handle_driver_setup(msg)
-    if isinstance(msg, UserDataResponse):
-        _LOG.debug(msg)
-        if _setup_step == SetupSteps.CONFIGURATION_MODE and "address" in msg.input_values:
-            return await handle_configuration_mode(msg)
-        if _setup_step == SetupSteps.DEVICE_CHOICE and "choice" in msg.input_values:
-            return await handle_device_choice(msg)
-        _LOG.error("No or invalid user response was received: %s", msg)
-    elif isinstance(msg, AbortDriverSetup):
-        _LOG.info("Setup was aborted with code: %s", msg.error)
-        _setup_step = SetupSteps.INIT
+    handler = _MESSAGE_HANDLERS.get(type(msg))
+    if handler is not None:
+        return await handler(msg)
 
     # user confirmation not used in setup process
     # if isinstance(msg, UserConfirmationResponse):
@@ -70,6 +66,27 @@ async def driver_setup_handler(msg: SetupDriver) -> SetupAction:
     return SetupError()
 
 
+async def _handle_driver_setup_request(msg: DriverSetupRequest) -> SetupAction:
+    _context.step = SetupSteps.INIT
+    return await handle_driver_setup(msg)
+
+
+async def _dispatch_user_data(msg: UserDataResponse) -> SetupAction:
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug("User data response: %r", msg)
+    field_id, handler = _USER_DATA_HANDLERS.get(_context.step, (None, None))
+    if handler is not None and field_id in msg.input_values:
+        return await handler(msg)
+    _LOG.error("No or invalid user response was received: %s", msg)
+    return SetupError()
+
+
+async def _handle_abort(msg: AbortDriverSetup) -> SetupAction:
+    _LOG.info("Setup was aborted with code: %s", msg.error)
+    _context.step = SetupSteps.INIT
+    return SetupError()
+
+
 async def handle_driver_setup(_msg: DriverSetupRequest) -> RequestUserInput | SetupError:
     """
     Start driver setup.
@@ -80,10 +97,8 @@ async def handle_driver_setup(_msg: DriverSetupRequest) -> RequestUserInput | Se
     :param _msg: not used, we don't have any input fields in the first setup screen.
     :return: the setup action on how to continue
     """
-    global _setup_step
-
     _LOG.debug("Starting driver setup")
-    _setup_step = SetupSteps.CONFIGURATION_MODE
+    _context.step = SetupSteps.CONFIGURATION_MODE
     # pylint: disable=line-too-long
     return RequestUserInput(
         {"en": "Setup mode"},
@@ -120,8 +135,6 @@ async def handle_configuration_mode(msg: UserDataResponse) -> RequestUserInput |
     :param msg: response data from the requested user data
     :return: the setup action on how to continue
     """
-    global _setup_step
-
     config.devices.clear()  # triggers device instance removal
 
     dropdown_items = []
@@ -133,15 +146,14 @@ async def handle_configuration_mode(msg: UserDataResponse) -> RequestUserInput |
 
     _LOG.debug("Starting manual driver setup for %s", address)
     try:
-        async with dunehd.Client(address) as client:
-            status = await client.status()
+        product_name, _ = await dunehd.Client(address, session=dunehd.shared_session()).probe()
     except Exception as e:  # pylint: disable=broad-exception-caught
         _LOG.error("Cannot connect to manually entered address %s: %s", address, e)
         return SetupError(error_type=IntegrationSetupError.CONNECTION_REFUSED)
 
-    dropdown_items.append({"id": address, "label": {"en": f"{status.product_name} [{address}]"}})
+    dropdown_items.append({"id": address, "label": {"en": f"{product_name} [{address}]"}})
 
-    _setup_step = SetupSteps.DEVICE_CHOICE
+    _context.step = SetupSteps.DEVICE_CHOICE
     return RequestUserInput(
         {"en": "Confirm your Dune-HD device"},
         [
@@ -167,17 +179,27 @@ async def handle_device_choice(msg: UserDataResponse) -> SetupComplete | SetupEr
     _LOG.debug("Chosen Dune-HD device: %s. Trying to connect and retrieve device information...", address)
 
     try:
-        async with dunehd.Client(address) as client:
-            status = await client.status()
+        product_name, serial_number = await dunehd.Client(address, session=dunehd.shared_session()).probe()
     except:  # pylint: disable=bare-except
         _LOG.error("Cannot connect to address %s", address)
         return SetupError(error_type=IntegrationSetupError.CONNECTION_REFUSED)
 
-    device = DuneHDDeviceConfig(status.serial_number, status.product_name, address)
+    device = DuneHDDeviceConfig(serial_number, product_name, address)
     config.devices.add(device)
     config.devices.store()
 
-    await asyncio.sleep(1)
-
     _LOG.info("Setup successfully completed for %s", device.name)
     return SetupComplete()
+
+
+_MESSAGE_HANDLERS: dict[type, Callable[[Any], Awaitable[SetupAction]]] = {
+    DriverSetupRequest: _handle_driver_setup_request,
+    UserDataResponse: _dispatch_user_data,
+    AbortDriverSetup: _handle_abort,
+}
+
+# Maps the current setup step to the expected user input field and its handler.
+_USER_DATA_HANDLERS: dict[SetupSteps, tuple[str, Callable[[UserDataResponse], Awaitable[SetupAction]]]] = {
+    SetupSteps.CONFIGURATION_MODE: ("address", handle_configuration_mode),
+    SetupSteps.DEVICE_CHOICE: ("choice", handle_device_choice),
+}